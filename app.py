@@ -1,81 +1,299 @@
+from importlib.util import find_spec
+import threading
 import streamlit as st
-import networkx as nx
-import plotly.graph_objects as go
-import pandas as pd
-import numpy as np
-
-def create_plotly_network(data_dict, title, field_names):
-    G = nx.Graph()
-    colors = {
-        'col1': '#e41a1c',  # Deep red for primary 
-        'col2': '#377eb8',  # Blue for devices
-        'col3': '#4daf4a',  # Green for IPs
-        'col4': '#984ea3'   # Purple for custom
-    }
+
+# Heavy modules are imported inside the functions that need them so the
+# input form paints first; optional extras are only probed here
+HAS_IGRAPH = find_spec('igraph') is not None  # C Fruchterman-Reingold
+HAS_DATASHADER = find_spec('datashader') is not None  # rasterizes huge edge sets
+
+COLORS = {
+    'col1': '#e41a1c',  # Deep red for primary 
+    'col2': '#377eb8',  # Blue for devices
+    'col3': '#4daf4a',  # Green for IPs
+    'col4': '#984ea3'   # Purple for custom
+}
+
+# Seed for every random start position, so layouts and their cache agree
+LAYOUT_SEED = 42
+# Above this many nodes layout='auto' uses spectral unless igraph is installed
+SPECTRAL_LAYOUT_MIN_NODES = 300
+# Above this many nodes spring layouts run fewer iterations
+SPRING_LAYOUT_MAX_NODES = 1000
+# Above this many nodes spring layouts use igraph when it is installed
+IGRAPH_LAYOUT_MIN_NODES = 300
+# Overlap with the last layout's nodes (shared / union) needed to warm-start
+WARM_START_MIN_OVERLAP = 0.7
+# Above this many edges traces render with WebGL instead of SVG
+WEBGL_MIN_EDGES = 1000
+# Above this many edges they are drawn as one image when datashader is installed
+DATASHADER_MIN_EDGES = 50_000
+
+# igraph's RNG is process-wide and sessions run in their own threads, so
+# seeded layouts take turns setting and restoring it
+IGRAPH_RNG_LOCK = threading.Lock()
+
+def clean_values(lines):
+    # Strip each line once (map runs str.strip in C) and drop blank ones
+    return [line for line in map(str.strip, lines) if line]
+
+def data_digest(data_tuple):
+    # One hashlib pass over the joined columns is far cheaper than letting
+    # st.cache_data hash every value; lines never contain '\n' after
+    # splitlines, and the column lengths keep field boundaries apart
+    import hashlib
+
+    h = hashlib.blake2b(digest_size=16)
+    for values in data_tuple:
+        h.update(f'{len(values)}\0'.encode())
+        h.update('\n'.join(values).encode('utf-8', 'surrogatepass'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_graph(digest, _data_tuple):
+    # Keyed on data_digest(_data_tuple) so the data itself is never hashed.
+    # One tuple per column in COLORS order; row order is kept (not sorted)
+    import numpy as np
+    import pandas as pd
+
+    # Object arrays hold references to the pasted strings; a fixed-width
+    # unicode array would pad every value to the longest one
+    lengths = [len(values) for values in _data_tuple]
+    values = np.concatenate([np.asarray(v, dtype=object) for v in _data_tuple])
+    codes = np.repeat(np.arange(len(_data_tuple), dtype=np.int8), lengths)
+
+    # Give every distinct non-blank value an integer id (sorted order)
+    keep = values != ''
+    inverse, node_ids = pd.factorize(values[keep], sort=True)
+    ids = np.full(len(values), -1, dtype=np.int32)
+    ids[keep] = inverse
+    n_nodes = len(node_ids)
+
+    # A value pasted under several fields takes the type of the last one
+    node_type = np.zeros(n_nodes, dtype=np.int8)
+    np.maximum.at(node_type, inverse, codes[keep])
+
+    # Only connect other fields to field1 (Client IDs), row by row
+    col_ids = np.split(ids, np.cumsum(lengths)[:-1])
+    src, dst = [], []
+    for other in col_ids[1:]:
+        n = min(len(col_ids[0]), len(other))
+        a, b = col_ids[0][:n], other[:n]
+        mask = (a >= 0) & (b >= 0)
+        src.append(a[mask])
+        dst.append(b[mask])
+    # Edges are undirected: order each pair, then keep it once however many
+    # rows (in either direction) repeat it
+    src, dst = np.concatenate(src), np.concatenate(dst)
+    lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+    stride = max(n_nodes, 1)
+    pair_keys = np.unique(lo.astype(np.int64) * stride + hi)
+    edges = np.column_stack(np.divmod(pair_keys, stride)).astype(np.int32)
+    degrees = np.bincount(edges.ravel(), minlength=n_nodes).astype(np.int32)
+
+    return node_ids, node_type, edges, degrees
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_layout(digest, _data_tuple, layout='auto', seed=LAYOUT_SEED):
+    # Cold layout only, so cached positions depend on the arguments alone
+    # and match a fresh run; warm starts happen per session, outside the cache
+    node_ids, node_type, edges, degrees = build_graph(digest, _data_tuple)
+    if not len(edges):
+        return None
+    return compute_layout(len(node_ids), edges, layout, seed=seed)
+
+def session_layout(digest, data_tuple, node_ids, edges, layout='auto'):
+    # Reuse this session's last positions for the same data, refine them when
+    # the data only changed a little, and otherwise use the cached cold layout
+    key = (digest, layout, LAYOUT_SEED)
+    prev = st.session_state.get('last_layout')
+    if prev is not None and prev[0] == key:
+        return prev[2]
+    init = warm_start_positions(node_ids, prev[1:]) if prev is not None else None
+    if init is None:
+        pos = build_layout(digest, data_tuple, layout, LAYOUT_SEED)
+    else:
+        pos = compute_layout(len(node_ids), edges, layout, init, LAYOUT_SEED)
+    st.session_state['last_layout'] = (key, node_ids, pos)
+    return pos
+
+def warm_start_positions(node_ids, warm_start, seed=LAYOUT_SEED):
+    # Previous (node_ids, pos) seed the new layout when the two node sets
+    # mostly overlap; new nodes start near the centroid of the kept ones
+    import numpy as np
+
+    prev_ids, prev_pos = warm_start
+    if not len(prev_ids) or not len(node_ids):
+        return None
+    where = np.minimum(np.searchsorted(prev_ids, node_ids), len(prev_ids) - 1)
+    found = prev_ids[where] == node_ids
+    shared = int(found.sum())
+    if shared / (len(prev_ids) + len(node_ids) - shared) < WARM_START_MIN_OVERLAP:
+        return None
+    init = np.empty((len(node_ids), 2), dtype=np.float32)
+    init[found] = prev_pos[where[found]]
+    jitter = np.random.default_rng(seed).normal(scale=0.05, size=(int((~found).sum()), 2))
+    init[~found] = init[found].mean(axis=0) + jitter
+    return init
+
+def compute_layout(n_nodes, edges, layout='auto', init=None, seed=LAYOUT_SEED):
+    # Spectral layout is one sparse eigensolve; spring is O(iterations * n^2).
+    # With igraph available, large spring layouts run in C and stay preferred.
+    import numpy as np
+    import networkx as nx
+
+    # Spectral needs a connected graph, checked once G is built below
+    auto = layout == 'auto'
+    if auto:
+        large = n_nodes > SPECTRAL_LAYOUT_MIN_NODES
+        layout = 'spectral' if large and not HAS_IGRAPH else 'spring'
+    if init is not None:
+        iterations = 10  # already near equilibrium
+    else:
+        iterations = 50 if n_nodes <= SPRING_LAYOUT_MAX_NODES else 20
+
+    if layout == 'spring' and HAS_IGRAPH and n_nodes > IGRAPH_LAYOUT_MIN_NODES:
+        import random
+        import igraph
+
+        # Seeded start positions keep the cached layout reproducible;
+        # igraph works at roughly sqrt(n) scale
+        if init is None:
+            init = np.random.default_rng(seed).uniform(-1, 1, (n_nodes, 2))
+        start = init * np.sqrt(n_nodes)
+        g = igraph.Graph(n=n_nodes, edges=edges.tolist())
+        # FR jitters nodes with igraph's RNG (Python's random by default);
+        # seed it for this call only, holding the lock until it is restored
+        with IGRAPH_RNG_LOCK:
+            igraph.set_random_number_generator(random.Random(seed))
+            try:
+                coords = np.asarray(g.layout_fruchterman_reingold(niter=iterations, seed=start.tolist()).coords)
+            finally:
+                igraph.set_random_number_generator(random)
+        # igraph re-centres the result onto its principal axes; rotate it back
+        # onto the start so warm-started layouts don't flip between runs
+        centred = coords - coords.mean(axis=0)
+        u, _, vt = np.linalg.svd(centred.T @ (start - start.mean(axis=0)))
+        # Same [-1, 1] scale as the NetworkX layouts, so either can warm-start the other
+        return nx.rescale_layout(centred @ (u @ vt)).astype(np.float32)
+
+    import scipy.sparse as sp
+
+    adjacency = sp.coo_array(
+        (np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n_nodes, n_nodes)
+    )
+    G = nx.from_scipy_sparse_array(adjacency)
+    # Separate rings would collapse onto single points under spectral
+    if auto and layout == 'spectral' and nx.number_connected_components(G) > 1:
+        layout = 'spring'
+    if layout == 'spectral':
+        pos = nx.spectral_layout(G)
+    else:
+        # Fixed seed makes the cold layout reproducible; warm starts pass pos
+        start = dict(enumerate(init.tolist())) if init is not None else None
+        pos = nx.spring_layout(
+            G, k=1/np.sqrt(n_nodes), pos=start, iterations=iterations, seed=seed
+        )
+    return np.array([pos[i] for i in range(n_nodes)], dtype=np.float32)
+
+def rasterize_edges(edge_xy):
+    # Draw every edge into one RGBA image laid under the node traces
+    import numpy as np
+    import pandas as pd
+    import datashader as ds
+    import datashader.transfer_functions as tf
+
+    x0, y0 = np.nanmin(edge_xy, axis=0)
+    x1, y1 = np.nanmax(edge_xy, axis=0)
+    canvas = ds.Canvas(plot_width=1600, plot_height=1000, x_range=(x0, x1), y_range=(y0, y1))
+    agg = canvas.line(pd.DataFrame({'x': edge_xy[:, 0], 'y': edge_xy[:, 1]}), 'x', 'y', agg=ds.count())
+    image = tf.shade(agg, cmap=['#cccccc', '#333333'], how='log').to_pil()
+    return dict(
+        source=image,
+        xref='x', yref='y',
+        x=x0, y=y1,
+        sizex=x1 - x0, sizey=y1 - y0,
+        sizing='stretch',
+        layer='below',
+        opacity=0.6
+    )
+
+def create_plotly_network(data_dict, title, field_names, layout='auto'):
+    import numpy as np
+    import plotly.graph_objects as go
+
+    data_tuple = tuple(tuple(data_dict.get(col, ())) for col in COLORS)
+    digest = data_digest(data_tuple)
+    node_ids, node_type, edges, degrees = build_graph(digest, data_tuple)
     
-    # Build graph
-    df = pd.DataFrame({k: pd.Series(v) for k, v in data_dict.items()})
+    if not len(edges):
+        fig = go.Figure(layout=go.Layout(
+            plot_bgcolor='white',
+            xaxis=dict(visible=False),
+            yaxis=dict(visible=False),
+            title=dict(text=title, x=0.5, xanchor='center', font=dict(size=20))
+        ))
+        fig.add_annotation(
+            text=f"Need {field_names['col1']} and at least one other field for connections",
+            showarrow=False,
+            font=dict(size=16)
+        )
+        return fig
     
-    # Add all nodes first
-    for col in df.columns:
-        for val in df[col].dropna():
-            if val:
-                G.add_node(str(val), color=colors[col], type=col)
+    pos = session_layout(digest, data_tuple, node_ids, edges, layout)
     
-    # Only connect other fields to field1 (Client IDs)
-    for _, row in df.iterrows():
-        client_id = str(row['col1'])
-        if pd.isna(client_id) or not client_id.strip():
-            continue
-            
-        # Connect client to all other fields in this row
-        for col in ['col2', 'col3', 'col4']:
-            if col in row and not pd.isna(row[col]) and row[col].strip():
-                G.add_edge(client_id, str(row[col]))
-
-    pos = nx.spring_layout(G, k=1/np.sqrt(len(G.nodes())), iterations=50)
+    # WebGL keeps large rings pannable; small ones keep crisp SVG
+    scatter = go.Scattergl if len(edges) > WEBGL_MIN_EDGES else go.Scatter
     
-    # Edges
-    edge_x = []
-    edge_y = []
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edge_x.extend([x0, x1, None])
-        edge_y.extend([y0, y1, None])
+    # Edges as one NaN-separated polyline; NumPy arrays are sent to
+    # Plotly.js as base64 typed arrays instead of JSON number lists
+    edge_xy = np.empty((3 * len(edges), 2), dtype=np.float32)
+    edge_xy[0::3] = pos[edges[:, 0]]
+    edge_xy[1::3] = pos[edges[:, 1]]
+    edge_xy[2::3] = np.nan
     
-    edge_trace = go.Scatter(
-        x=edge_x, y=edge_y,
-        line=dict(width=0.7, color='#333333'),
-        hoverinfo='none',
-        mode='lines',
-        opacity=0.2
-    )
+    edge_image = None
+    if HAS_DATASHADER and len(edges) > DATASHADER_MIN_EDGES:
+        edge_image = rasterize_edges(edge_xy)
+        edge_traces = []
+    else:
+        edge_traces = [scatter(
+            x=edge_xy[:, 0], y=edge_xy[:, 1],
+            line=dict(width=0.7, color='#333333'),
+            hoverinfo='none',
+            mode='lines',
+            opacity=0.2
+        )]
     
-    # Nodes by type with labels
+    # Nodes by type with labels; one stable sort groups ids by type
+    by_type = np.argsort(node_type, kind='stable')
+    bounds = np.searchsorted(node_type[by_type], np.arange(len(COLORS) + 1))
     node_traces = []
-    for col, color in colors.items():
-        nodes = [n for n, attr in G.nodes(data=True) if attr.get('type') == col]
-        if not nodes:
+    for code, (col, color) in enumerate(COLORS.items()):
+        idx = by_type[bounds[code]:bounds[code + 1]]
+        if not len(idx):
             continue
             
-        x = [pos[node][0] for node in nodes]
-        y = [pos[node][1] for node in nodes]
-        degrees = [G.degree(node) for node in nodes]
+        nodes = node_ids[idx].tolist()
+        x = pos[idx, 0]
+        y = pos[idx, 1]
+        node_degrees = degrees[idx]
+        hover_mid = f"<br>{field_names[col]}<br>Connections: "
         
-        node_traces.append(go.Scatter(
+        node_traces.append(scatter(
             x=x, y=y,
             mode='markers+text',
-            hovertext=[f"{node}<br>{field_names[col]}<br>Connections: {G.degree(node)}" 
-                      for node in nodes],
-            text=[str(node) for node in nodes],
+            hovertext=[f"{node}{hover_mid}{deg}" 
+                      for node, deg in zip(nodes, node_degrees.tolist())],
+            text=nodes,
             textposition="bottom center",
             textfont=dict(
                 size=10,
                 color='black'
             ),
             marker=dict(
-                size=[30 + (deg * 5) for deg in degrees],
+                size=30 + 5 * node_degrees,
                 color=color,
                 line_width=2,
                 line_color='white'
@@ -85,7 +303,7 @@ def create_plotly_network(data_dict, title, field_names):
         ))
 
     fig = go.Figure(
-        data=[edge_trace] + node_traces,
+        data=edge_traces + node_traces,
         layout=go.Layout(
             showlegend=True,
             hovermode='closest',
@@ -111,6 +329,8 @@ def create_plotly_network(data_dict, title, field_names):
             )
         )
     )
+    if edge_image is not None:
+        fig.add_layout_image(edge_image)
     
     return fig
 
@@ -128,26 +348,28 @@ data = {}
 
 with col1:
     field_names['col1'] = st.text_input("Field 1 Name", "Client IDs")
-    data['col1'] = st.text_area(f"Paste {field_names['col1']}", height=150).split('\n')
+    data['col1'] = st.text_area(f"Paste {field_names['col1']}", height=150).splitlines()
 
 with col2:
     field_names['col2'] = st.text_input("Field 2 Name", "Device IDs")
-    data['col2'] = st.text_area(f"Paste {field_names['col2']}", height=150).split('\n')
+    data['col2'] = st.text_area(f"Paste {field_names['col2']}", height=150).splitlines()
 
 with col3:
     field_names['col3'] = st.text_input("Field 3 Name", "Passwords")
-    data['col3'] = st.text_area(f"Paste {field_names['col3']}", height=150).split('\n')
+    data['col3'] = st.text_area(f"Paste {field_names['col3']}", height=150).splitlines()
 
 with col4:
     field_names['col4'] = st.text_input("Field 4 Name", "Custom Field")
-    data['col4'] = st.text_area(f"Paste {field_names['col4']}", height=150).split('\n')
+    data['col4'] = st.text_area(f"Paste {field_names['col4']}", height=150).splitlines()
 
 if st.button("Analyze", type="primary"):
     # Clean data
-    data = {k: [x.strip() for x in v if x.strip()] for k, v in data.items()}
+    data = {k: clean_values(v) for k, v in data.items()}
     
-    if any(data.values()):
+    if data['col1'] and any(data[col] for col in ['col2', 'col3', 'col4']):
         fig = create_plotly_network(data, title, field_names)
         st.plotly_chart(fig, use_container_width=True)
+    elif any(data.values()):
+        st.warning(f"Paste {field_names['col1']} and at least one other field to see connections")
     else:
         st.warning("Paste some data first")